@@ -4,11 +4,15 @@ Implements a multi-agent debate system using Groq API.
 """
 
 import os
-import json
 import time
-from typing import List, Optional
+import random
+import asyncio
+import hashlib
+from collections import OrderedDict, Counter
+from typing import List, Optional, Dict, Tuple, NamedTuple
+import orjson
 from dotenv import load_dotenv
-from groq import Groq
+from groq import AsyncGroq
 
 from models import (
     Transaction, Decision, ActionType, AgentSource,
@@ -18,6 +22,15 @@ from models import (
 load_dotenv()
 
 
+class FailureSummary(NamedTuple):
+    """Aggregate view of a batch of failed transactions."""
+    total_amount: float
+    banks: List[str]
+    common_error: str
+    dominant_bank: Optional[str]
+    dominant_bank_share: float
+
+
 class LLMCouncil:
     """
     Multi-agent LLM Council that debates payment operation decisions.
@@ -58,6 +71,48 @@ Respond in JSON format:
     "suggested_action": "switch_gateway|increase_retry|block_merchant|reduce_load|no_action"
 }"""
 
+    COMBINED_AGENTS_PROMPT = """You are TWO agents in a payment operations council, answering together.
+
+RISK AGENT: Paranoid, security-focused, hates fraud.
+Protect the system from fraud and abuse at all costs; rather block a
+legitimate transaction than let a fraudulent one through.
+Argue for the most CONSERVATIVE action.
+Consider: fraud patterns, unusual amounts, bank reliability, error patterns.
+
+GROWTH AGENT: Revenue-obsessed, hates lost sales, aggressive optimizer.
+Maximize successful transactions and revenue recovery; every failed
+transaction is lost money that must be recovered.
+Argue for the most AGGRESSIVE recovery action.
+Consider: revenue impact, retry success probability, customer experience.
+
+Analyze the failed transactions independently as each agent.
+Respond in JSON format:
+{
+    "risk": {
+        "stance": "conservative/moderate/aggressive",
+        "argument": "Risk Agent's reasoning in 2-3 sentences",
+        "suggested_action": "switch_gateway|increase_retry|block_merchant|reduce_load|no_action"
+    },
+    "growth": {
+        "stance": "conservative/moderate/aggressive",
+        "argument": "Growth Agent's reasoning in 2-3 sentences",
+        "suggested_action": "switch_gateway|increase_retry|block_merchant|reduce_load|no_action"
+    }
+}"""
+
+    # Stand-in agent response when a Groq call fails
+    AGENT_FALLBACK = {
+        "stance": "moderate",
+        "argument": "Unable to analyze due to API error",
+        "suggested_action": "no_action"
+    }
+    COMBINED_FALLBACK = {"risk": AGENT_FALLBACK, "growth": AGENT_FALLBACK}
+
+    # Failures concentrated on one bank with a transport-level error are
+    # resolved by rerouting; no debate is needed
+    SHORTCUT_BANK_SHARE = 0.8
+    SHORTCUT_ERRORS = {"E001_TIMEOUT", "E004_NETWORK_ERROR"}
+
     MANAGER_AGENT_PROMPT = """You are the MANAGER AGENT in a payment operations council.
 You must synthesize the arguments from the Risk Agent and Growth Agent.
 Make a balanced decision that optimizes for both security AND revenue.
@@ -75,30 +130,44 @@ Failed transaction context:
 - Total amount at risk: ₹{total_amount}
 
 Make the FINAL decision. Respond in JSON format:
-{
+{{
     "synthesis": "Your balanced reasoning in 2-3 sentences",
     "final_action": "switch_gateway|increase_retry|block_merchant|reduce_load|no_action",
     "confidence": 0.0-1.0
-}"""
+}}"""
 
-    def __init__(self, model: str = "llama3-70b-8192"):
+    def __init__(self, model: str = "llama3-70b-8192", batched: bool = True,
+                 cache_size: int = 128, cache_ttl: float = 60.0):
         """
         Initialize the LLM Council.
         
         Args:
             model: Groq model to use for inference
+            batched: Ask Risk and Growth in a single combined call
+            cache_size: Maximum number of debates kept in the cache
+            cache_ttl: Seconds a cached debate stays valid
         """
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY environment variable not set")
         
-        self.client = Groq(api_key=api_key)
+        self.client = AsyncGroq(api_key=api_key)
         self.model = model
+        self.batched = batched
         
-    def _call_agent(self, system_prompt: str, context: str) -> dict:
-        """Make a single agent call to Groq."""
+        # Debate cache: failure signature -> (inserted_at, debate)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: OrderedDict[str, Tuple[float, CouncilDebate]] = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self.shortcut_hits = 0
+        
+    async def _call_agent(self, system_prompt: str, context: str,
+                          fallback: Optional[dict] = None) -> Tuple[dict, bool]:
+        """Make a single agent call to Groq; the flag is False if the fallback was used."""
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -108,16 +177,34 @@ Make the FINAL decision. Respond in JSON format:
                 max_tokens=500,
                 response_format={"type": "json_object"}
             )
-            return json.loads(response.choices[0].message.content)
+            return orjson.loads(response.choices[0].message.content), True
         except Exception as e:
             print(f"Agent call failed: {e}")
-            return {
-                "stance": "moderate",
-                "argument": "Unable to analyze due to API error",
-                "suggested_action": "no_action"
-            }
+            return fallback or self.AGENT_FALLBACK, False
+    
+    def _summarize(self, failed_transactions: List[Transaction]) -> FailureSummary:
+        """Compute summary stats for a batch of failures in a single pass."""
+        total_amount = 0.0
+        banks = Counter()
+        errors = Counter()
+        for txn in failed_transactions:
+            total_amount += txn.amount
+            banks[txn.bank_name] += 1
+            if txn.error_code:
+                errors[txn.error_code] += 1
+        
+        common_error = errors.most_common(1)[0][0] if errors else "Unknown"
+        if banks:
+            dominant_bank, dominant_count = banks.most_common(1)[0]
+            dominant_share = dominant_count / len(failed_transactions)
+        else:
+            dominant_bank, dominant_share = None, 0.0
+        
+        return FailureSummary(total_amount, sorted(banks), common_error,
+                              dominant_bank, dominant_share)
     
-    def _prepare_context(self, failed_transactions: List[Transaction]) -> str:
+    def _prepare_context(self, failed_transactions: List[Transaction],
+                         summary: FailureSummary) -> str:
         """Prepare transaction context for agents."""
         if not failed_transactions:
             return "No failed transactions to analyze."
@@ -130,19 +217,103 @@ Make the FINAL decision. Respond in JSON format:
             )
         
         # Summary stats
-        total_amount = sum(t.amount for t in failed_transactions)
-        banks = set(t.bank_name for t in failed_transactions)
-        errors = [t.error_code for t in failed_transactions if t.error_code]
-        common_error = max(set(errors), key=errors.count) if errors else "Unknown"
-        
         context_lines.append(f"\nSummary: {len(failed_transactions)} failures, "
-                           f"₹{total_amount:.2f} at risk, Banks: {', '.join(banks)}")
+                           f"₹{summary.total_amount:.2f} at risk, Banks: {', '.join(summary.banks)}")
         
         return "\n".join(context_lines)
     
-    def debate(self, failed_transactions: List[Transaction]) -> CouncilDebate:
+    @staticmethod
+    def _bucket(value: float) -> int:
+        """Power-of-two bucket so near-identical scenarios share a key."""
+        return int(value).bit_length()
+    
+    def _signature(self, failed_transactions: List[Transaction],
+                   summary: FailureSummary) -> str:
+        """Build a cache key from the shape of a batch of failures."""
+        raw = (f"{summary.banks}|{summary.common_error}|{self._bucket(summary.total_amount)}|"
+               f"{self._bucket(len(failed_transactions))}")
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[CouncilDebate]:
+        """Return a cached debate if present and not expired."""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        inserted_at, debate = entry
+        if time.time() - inserted_at > self.cache_ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return debate
+    
+    def _cache_put(self, key: str, debate: CouncilDebate) -> None:
+        """Insert a debate, evicting the least recently used entry if full."""
+        self._cache[key] = (time.time(), debate)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def cache_stats(self) -> Dict:
+        """Get debate cache statistics."""
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            'hits': self._cache_hits,
+            'misses': self._cache_misses,
+            'hit_rate': self._cache_hits / lookups if lookups else 0.0,
+            'size': len(self._cache),
+            'max_size': self.cache_size,
+            'ttl_seconds': self.cache_ttl,
+            'shortcut_hits': self.shortcut_hits
+        }
+    
+    def _shortcut(self, failed_transactions: List[Transaction],
+                  summary: FailureSummary) -> Optional[CouncilDebate]:
+        """
+        Resolve trivially-determined failure patterns without calling Groq.
+        
+        Returns None when the pattern is not concentrated enough.
+        """
+        if (summary.dominant_bank_share <= self.SHORTCUT_BANK_SHARE
+                or summary.common_error not in self.SHORTCUT_ERRORS):
+            return None
+        
+        bank = summary.dominant_bank
+        share = summary.dominant_bank_share
+        synthesis = (f"{share:.0%} of failures are {summary.common_error} on {bank}; "
+                     f"rerouting away from the degraded gateway is the clear fix.")
+        
+        return CouncilDebate(
+            risk_argument=AgentArgument(
+                agent_name="Risk Agent",
+                stance="moderate",
+                argument=f"Failures are isolated to {bank} with a transport error, not a fraud signal.",
+                suggested_action=ActionType.SWITCH_GATEWAY
+            ),
+            growth_argument=AgentArgument(
+                agent_name="Growth Agent",
+                stance="aggressive",
+                argument=f"Retrying through {bank} will keep failing; switch to recover revenue now.",
+                suggested_action=ActionType.SWITCH_GATEWAY
+            ),
+            manager_synthesis=synthesis,
+            final_decision=Decision(
+                action=ActionType.SWITCH_GATEWAY,
+                reasoning=synthesis,
+                confidence_score=0.95,
+                agent_source=AgentSource.TEACHER
+            ),
+            debate_duration_ms=0
+        )
+    
+    async def debate(self, failed_transactions: List[Transaction]) -> CouncilDebate:
         """
         Run a full council debate on the failed transactions.
+
+        The Risk and Growth agents are independent, so they are answered by
+        one combined call (or two concurrent calls when not batched); the
+        Manager then synthesizes both responses.
+        Trivially-determined patterns are resolved by rule, and debates for a
+        recently seen failure signature are served from cache.
         
         Args:
             failed_transactions: List of failed Transaction objects
@@ -151,10 +322,44 @@ Make the FINAL decision. Respond in JSON format:
             CouncilDebate with all agent arguments and final decision
         """
         start_time = time.time()
-        context = self._prepare_context(failed_transactions)
         
-        # Get Risk Agent's view
-        risk_response = self._call_agent(self.RISK_AGENT_PROMPT, context)
+        summary = self._summarize(failed_transactions)
+        
+        shortcut = self._shortcut(failed_transactions, summary)
+        if shortcut is not None:
+            self.shortcut_hits += 1
+            return shortcut
+        
+        cache_key = self._signature(failed_transactions, summary)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            self._cache_hits += 1
+            return cached.model_copy(update={
+                "debate_duration_ms": int((time.time() - start_time) * 1000)
+            })
+        self._cache_misses += 1
+        
+        context = self._prepare_context(failed_transactions, summary)
+        
+        if self.batched:
+            # Get Risk and Growth views from one combined call
+            combined, agents_ok = await self._call_agent(
+                self.COMBINED_AGENTS_PROMPT, context, fallback=self.COMBINED_FALLBACK
+            )
+            risk_response = combined.get("risk")
+            growth_response = combined.get("growth")
+            if not isinstance(risk_response, dict):
+                risk_response = {}
+            if not isinstance(growth_response, dict):
+                growth_response = {}
+        else:
+            # Get Risk and Growth views concurrently
+            (risk_response, risk_ok), (growth_response, growth_ok) = await asyncio.gather(
+                self._call_agent(self.RISK_AGENT_PROMPT, context),
+                self._call_agent(self.GROWTH_AGENT_PROMPT, context)
+            )
+            agents_ok = risk_ok and growth_ok
+        
         risk_arg = AgentArgument(
             agent_name="Risk Agent",
             stance=risk_response.get("stance", "moderate"),
@@ -162,8 +367,6 @@ Make the FINAL decision. Respond in JSON format:
             suggested_action=ActionType(risk_response.get("suggested_action", "no_action"))
         )
         
-        # Get Growth Agent's view
-        growth_response = self._call_agent(self.GROWTH_AGENT_PROMPT, context)
         growth_arg = AgentArgument(
             agent_name="Growth Agent",
             stance=growth_response.get("stance", "moderate"),
@@ -172,21 +375,16 @@ Make the FINAL decision. Respond in JSON format:
         )
         
         # Manager synthesizes
-        total_amount = sum(t.amount for t in failed_transactions)
-        banks = set(t.bank_name for t in failed_transactions)
-        errors = [t.error_code for t in failed_transactions if t.error_code]
-        common_error = max(set(errors), key=errors.count) if errors else "Unknown"
-        
         manager_prompt = self.MANAGER_AGENT_PROMPT.format(
             risk_argument=f"{risk_arg.stance}: {risk_arg.argument}",
             growth_argument=f"{growth_arg.stance}: {growth_arg.argument}",
             failed_count=len(failed_transactions),
-            common_error=common_error,
-            affected_banks=", ".join(banks),
-            total_amount=total_amount
+            common_error=summary.common_error,
+            affected_banks=", ".join(summary.banks),
+            total_amount=summary.total_amount
         )
         
-        manager_response = self._call_agent(manager_prompt, context)
+        manager_response, manager_ok = await self._call_agent(manager_prompt, context)
         
         # Build final decision
         final_decision = Decision(
@@ -198,24 +396,35 @@ Make the FINAL decision. Respond in JSON format:
         
         duration_ms = int((time.time() - start_time) * 1000)
         
-        return CouncilDebate(
+        debate = CouncilDebate(
             risk_argument=risk_arg,
             growth_argument=growth_arg,
             manager_synthesis=manager_response.get("synthesis", ""),
             final_decision=final_decision,
             debate_duration_ms=duration_ms
         )
+        # Don't replay a fallback decision from a failed API call
+        if agents_ok and manager_ok:
+            self._cache_put(cache_key, debate)
+        return debate
 
 
 class MockCouncil:
     """Mock council for testing without API calls."""
     
-    def debate(self, failed_transactions: List[Transaction]) -> CouncilDebate:
-        """Return a mock debate result."""
-        import random
+    def __init__(self, seed: Optional[int] = None):
+        """
+        Initialize the mock council.
         
+        Args:
+            seed: Seed for this council's own RNG, for reproducible debates
+        """
+        self._rng = random.Random(seed)
+    
+    async def debate(self, failed_transactions: List[Transaction]) -> CouncilDebate:
+        """Return a mock debate result."""
         actions = list(ActionType)
-        selected_action = random.choice(actions)
+        selected_action = self._rng.choice(actions)
         
         return CouncilDebate(
             risk_argument=AgentArgument(
@@ -234,11 +443,16 @@ class MockCouncil:
             final_decision=Decision(
                 action=selected_action,
                 reasoning="Synthesized decision based on risk-reward analysis",
-                confidence_score=random.uniform(0.6, 0.95),
+                confidence_score=self._rng.uniform(0.6, 0.95),
                 agent_source=AgentSource.TEACHER
             ),
-            debate_duration_ms=random.randint(500, 2000)
+            debate_duration_ms=self._rng.randint(500, 2000)
         )
+    
+    def cache_stats(self) -> Dict:
+        """Mock council never caches."""
+        return {'hits': 0, 'misses': 0, 'hit_rate': 0.0, 'size': 0,
+                'max_size': 0, 'ttl_seconds': 0.0, 'shortcut_hits': 0}
 
 
 def get_council(use_mock: bool = False) -> LLMCouncil | MockCouncil:
@@ -260,7 +474,7 @@ if __name__ == "__main__":
     print(f"Testing council with {len(failed)} failed transactions...")
     
     council = get_council(use_mock=True)
-    debate = council.debate(failed)
+    debate = asyncio.run(council.debate(failed))
     
     print(f"\n🔴 Risk Agent ({debate.risk_argument.stance}):")
     print(f"   {debate.risk_argument.argument}")
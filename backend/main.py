@@ -4,8 +4,9 @@ Orchestrates the Teacher-Student architecture with WebSocket real-time updates.
 """
 
 import asyncio
-import json
-from typing import List, Set
+import orjson
+from typing import Deque, List, Optional, Set
+from collections import deque
 from contextlib import asynccontextmanager
 from datetime import datetime
 
@@ -26,7 +27,10 @@ from student import OnlineLearner, StudentDecisionMaker
 
 class AppConfig:
     TRANSACTION_INTERVAL_MS = 500  # Generate transaction every 500ms
+    METRICS_INTERVAL_MS = 1000  # Broadcast metrics at most once per second
     FAILURE_THRESHOLD = 5  # Failures before triggering Council
+    MAX_RECENT_FAILURES = max(2 * FAILURE_THRESHOLD, 50)  # Cap on buffered failures
+    DEBATE_QUEUE_SIZE = 4  # Failure batches waiting for the Council
     STUDENT_CONFIDENCE_THRESHOLD = 0.90
     USE_MOCK_COUNCIL = False  # Set True for testing without Groq API
 
@@ -41,8 +45,13 @@ class AppState:
         self.student_maker = StudentDecisionMaker(self.learner)
         
         self.metrics = SystemMetrics()
-        self.recent_failures: List[Transaction] = []
+        self.metrics_dirty = False
+        self.latest_metrics_frame: bytes = b""  # Last serialized metrics message
+        self.recent_failures: Deque[Transaction] = deque(maxlen=AppConfig.MAX_RECENT_FAILURES)
+        # Created in lifespan so it belongs to the running event loop
+        self.debate_queue: Optional[asyncio.Queue[List[Transaction]]] = None
         self.is_running = False
+        self.background_tasks: List[asyncio.Task] = []
         self.connected_clients: Set[WebSocket] = set()
 
 
@@ -57,9 +66,22 @@ async def lifespan(app: FastAPI):
     print("🚀 Payment Ops System starting...")
     print(f"   Council: {'Mock' if isinstance(state.council, MockCouncil) else 'Groq LLM'}")
     print(f"   Student confidence threshold: {AppConfig.STUDENT_CONFIDENCE_THRESHOLD:.0%}")
+    
+    # Exactly one instance of each background loop for the app's lifetime
+    state.debate_queue = asyncio.Queue(maxsize=AppConfig.DEBATE_QUEUE_SIZE)
+    state.is_running = True
+    state.background_tasks = [
+        asyncio.create_task(transaction_loop()),
+        asyncio.create_task(metrics_broadcaster()),
+        asyncio.create_task(council_worker())
+    ]
     yield
     print("👋 Payment Ops System shutting down...")
     state.is_running = False
+    for task in state.background_tasks:
+        task.cancel()
+    await asyncio.gather(*state.background_tasks, return_exceptions=True)
+    state.background_tasks = []
 
 
 # ============== FastAPI App ==============
@@ -82,28 +104,54 @@ app.add_middleware(
 
 # ============== WebSocket Manager ==============
 
+def encode_message(message: WebSocketMessage) -> bytes:
+    """Serialize a message to the UTF-8 JSON bytes sent on the wire."""
+    return orjson.dumps(message.model_dump(mode='json'), default=str)
+
+
+def encode_metrics() -> bytes:
+    """Serialize current metrics and remember the frame for new clients."""
+    state.latest_metrics_frame = encode_message(WebSocketMessage(
+        type="metrics",
+        data=state.metrics.model_dump(mode='json')
+    ))
+    return state.latest_metrics_frame
+
+
 async def broadcast(message: WebSocketMessage):
     """Broadcast message to all connected WebSocket clients."""
     if not state.connected_clients:
         return
     
-    data = json.dumps(message.model_dump(), default=str)
-    disconnected = set()
+    # Encode once; every client receives the same UTF-8 bytes
+    await broadcast_bytes(encode_message(message))
+
+
+async def broadcast_bytes(payload: bytes):
+    """Send an already-encoded frame to all connected WebSocket clients."""
+    if not state.connected_clients:
+        return
     
-    for client in state.connected_clients:
-        try:
-            await client.send_text(data)
-        except Exception:
-            disconnected.add(client)
+    # Send to all clients concurrently so one slow socket can't stall the rest
+    clients = list(state.connected_clients)
+    results = await asyncio.gather(
+        *(client.send_bytes(payload) for client in clients),
+        return_exceptions=True
+    )
+    disconnected = {
+        client for client, result in zip(clients, results)
+        if isinstance(result, Exception)
+    }
     
     state.connected_clients -= disconnected
 
 
 async def emit_transaction(txn: Transaction):
     """Emit a transaction event."""
+    # Dump straight to JSON-native types so the frame needs no fallback encoding
     await broadcast(WebSocketMessage(
         type="transaction",
-        data=txn.model_dump()
+        data=txn.model_dump(mode='json')
     ))
 
 
@@ -112,7 +160,7 @@ async def emit_decision(decision: Decision, transaction: Transaction):
     await broadcast(WebSocketMessage(
         type="decision",
         data={
-            "decision": decision.model_dump(),
+            "decision": decision.model_dump(mode='json'),
             "transaction_id": transaction.id,
             "brain": decision.agent_source.value
         }
@@ -121,10 +169,7 @@ async def emit_decision(decision: Decision, transaction: Transaction):
 
 async def emit_metrics():
     """Emit current metrics."""
-    await broadcast(WebSocketMessage(
-        type="metrics",
-        data=state.metrics.model_dump()
-    ))
+    await broadcast_bytes(encode_metrics())
 
 
 async def emit_council_debate(debate):
@@ -132,10 +177,10 @@ async def emit_council_debate(debate):
     await broadcast(WebSocketMessage(
         type="council_debate",
         data={
-            "risk_argument": debate.risk_argument.model_dump(),
-            "growth_argument": debate.growth_argument.model_dump(),
+            "risk_argument": debate.risk_argument.model_dump(mode='json'),
+            "growth_argument": debate.growth_argument.model_dump(mode='json'),
             "manager_synthesis": debate.manager_synthesis,
-            "final_decision": debate.final_decision.model_dump(),
+            "final_decision": debate.final_decision.model_dump(mode='json'),
             "duration_ms": debate.debate_duration_ms
         }
     ))
@@ -146,7 +191,8 @@ async def emit_council_debate(debate):
 async def process_transaction(txn: Transaction):
     """Process a single transaction through the Teacher-Student pipeline."""
     
-    # Update metrics
+    # Update metrics; mark them dirty after each change, before any await,
+    # so the broadcaster never clears the flag ahead of a newer value
     state.metrics.total_transactions += 1
     if txn.status == TransactionStatus.SUCCESS:
         state.metrics.successful_transactions += 1
@@ -159,59 +205,92 @@ async def process_transaction(txn: Transaction):
         state.metrics.success_rate = (
             state.metrics.successful_transactions / state.metrics.total_transactions
         )
+    state.metrics_dirty = True
     
     # Emit transaction
     await emit_transaction(txn)
     
     # Only make decisions on failures
     if txn.status != TransactionStatus.FAILED:
-        await emit_metrics()
         return
     
     # Check if Student is confident enough
     is_confident, predicted_action, confidence = state.learner.is_confident(txn)
     state.metrics.student_confidence = confidence
+    state.metrics_dirty = True
     
     if is_confident:
-        # FAST PATH: Student makes the decision
-        decision = Decision(
+        # FAST PATH: Student makes the decision (fields are known-valid)
+        decision = Decision.model_construct(
             action=predicted_action,
             reasoning=f"Student model confident ({confidence:.1%}) based on {state.learner.samples_seen} samples",
             confidence_score=confidence,
-            agent_source=AgentSource.STUDENT
+            agent_source=AgentSource.STUDENT,
+            timestamp=datetime.now()
         )
         state.metrics.student_decisions += 1
+        state.metrics_dirty = True
         await emit_decision(decision, txn)
         
     elif len(state.recent_failures) >= AppConfig.FAILURE_THRESHOLD:
-        # SLOW PATH: Council deliberation
-        debate = state.council.debate(state.recent_failures)
-        await emit_council_debate(debate)
-        
-        decision = debate.final_decision
-        state.metrics.teacher_decisions += 1
-        await emit_decision(decision, txn)
-        
-        # Train the Student on all recent failures
-        for failed_txn in state.recent_failures:
-            state.learner.learn(failed_txn, decision)
+        # SLOW PATH: hand the batch to the Council worker
+        try:
+            state.debate_queue.put_nowait(list(state.recent_failures))
+        except asyncio.QueueFull:
+            # Council is backed up; keep buffering and retry on the next failure
+            return
         
         # Clear failure buffer
-        state.recent_failures = []
+        state.recent_failures.clear()
+
+
+async def run_council(failed_transactions: List[Transaction]):
+    """Run a Council debate on a batch of failures and train the Student on it."""
+    debate = await state.council.debate(failed_transactions)
+    await emit_council_debate(debate)
     
-    await emit_metrics()
+    decision = debate.final_decision
+    state.metrics.teacher_decisions += 1
+    state.metrics_dirty = True
+    await emit_decision(decision, failed_transactions[-1])
+    
+    # Train the Student on all failures in the batch
+    state.learner.learn_batch(failed_transactions, decision)
+
+
+async def council_worker():
+    """Consume failure batches so Council latency never stalls the transaction loop."""
+    while state.is_running:
+        batch = await state.debate_queue.get()
+        try:
+            await run_council(batch)
+        except Exception as e:
+            print(f"Council debate failed: {e}")
+        finally:
+            state.debate_queue.task_done()
 
 
 async def transaction_loop():
     """Main loop that generates and processes transactions."""
-    state.is_running = True
-    
     while state.is_running:
         txn = state.simulator.generate_transaction()
-        await process_transaction(txn)
+        try:
+            await process_transaction(txn)
+        except Exception as e:
+            # Log and keep simulating rather than silently ending the task
+            print(f"Transaction processing failed: {e}")
         await asyncio.sleep(AppConfig.TRANSACTION_INTERVAL_MS / 1000)
 
 
+async def metrics_broadcaster():
+    """Emit metrics on a fixed tick, only when they changed since the last one."""
+    while state.is_running:
+        if state.metrics_dirty:
+            state.metrics_dirty = False
+            await emit_metrics()
+        await asyncio.sleep(AppConfig.METRICS_INTERVAL_MS / 1000)
+
+
 # ============== WebSocket Endpoint ==============
 
 @app.websocket("/ws")
@@ -221,15 +300,10 @@ async def websocket_endpoint(websocket: WebSocket):
     state.connected_clients.add(websocket)
     print(f"📡 Client connected. Total: {len(state.connected_clients)}")
     
-    # Send current metrics on connect
-    await websocket.send_text(json.dumps(
-        WebSocketMessage(type="metrics", data=state.metrics.model_dump()).model_dump(),
-        default=str
-    ))
-    
-    # Start transaction loop if first client
-    if len(state.connected_clients) == 1:
-        asyncio.create_task(transaction_loop())
+    # Send current metrics on connect, reusing the last frame if still current
+    if state.metrics_dirty or not state.latest_metrics_frame:
+        encode_metrics()
+    await websocket.send_bytes(state.latest_metrics_frame)
     
     try:
         while True:
@@ -240,10 +314,6 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         state.connected_clients.discard(websocket)
         print(f"📡 Client disconnected. Total: {len(state.connected_clients)}")
-        
-        # Stop loop if no clients
-        if len(state.connected_clients) == 0:
-            state.is_running = False
 
 
 # ============== REST Endpoints ==============
@@ -284,7 +354,7 @@ async def reset_chaos():
 @app.get("/metrics")
 async def get_metrics():
     """Get current system metrics."""
-    return state.metrics.model_dump()
+    return state.metrics.model_dump(mode='json')
 
 
 @app.get("/student/stats")
@@ -293,6 +363,12 @@ async def get_student_stats():
     return state.learner.get_stats()
 
 
+@app.get("/council/stats")
+async def get_council_stats():
+    """Get Council debate cache statistics."""
+    return state.council.cache_stats()
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
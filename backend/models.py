@@ -1,9 +1,12 @@
 """
 Pydantic models for Payment Operations System.
 Defines Transaction, Decision, and CouncilDebate schemas.
+
+Event models are frozen: they are never mutated after construction, and
+serialize to JSON natively via model_dump(mode='json').
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Literal
 from enum import Enum
 from datetime import datetime
@@ -39,6 +42,8 @@ class AgentSource(str, Enum):
 
 class Transaction(BaseModel):
     """Represents a payment transaction."""
+    model_config = ConfigDict(frozen=True)
+    
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     amount: float = Field(..., gt=0, description="Transaction amount")
     currency: str = Field(default="INR", description="Currency code")
@@ -50,28 +55,22 @@ class Transaction(BaseModel):
     latency_ms: int = Field(..., ge=0, description="Processing latency in milliseconds")
     timestamp: datetime = Field(default_factory=datetime.now)
 
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-
 
 class Decision(BaseModel):
     """Represents a decision made by either Student or Teacher."""
+    model_config = ConfigDict(frozen=True)
+    
     action: ActionType = Field(..., description="Action to take")
     reasoning: str = Field(..., description="Explanation for the decision")
     confidence_score: float = Field(..., ge=0, le=1, description="Confidence 0-1")
     agent_source: AgentSource = Field(..., description="Who made the decision")
     timestamp: datetime = Field(default_factory=datetime.now)
 
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-
 
 class AgentArgument(BaseModel):
     """An agent's argument during council debate."""
+    model_config = ConfigDict(frozen=True)
+    
     agent_name: str
     stance: str
     argument: str
@@ -80,6 +79,8 @@ class AgentArgument(BaseModel):
 
 class CouncilDebate(BaseModel):
     """Represents the full debate from the LLM Council."""
+    model_config = ConfigDict(frozen=True)
+    
     risk_argument: AgentArgument
     growth_argument: AgentArgument
     manager_synthesis: str
@@ -102,11 +103,8 @@ class SystemMetrics(BaseModel):
 
 class WebSocketMessage(BaseModel):
     """Message format for WebSocket communication."""
+    model_config = ConfigDict(frozen=True)
+    
     type: Literal["transaction", "decision", "metrics", "council_debate"]
     data: dict
     timestamp: datetime = Field(default_factory=datetime.now)
-
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
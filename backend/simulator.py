@@ -3,8 +3,11 @@ Transaction Simulator for Payment Operations System.
 Generates realistic mock payment transactions with chaos injection capability.
 """
 
+import itertools
 import random
+from datetime import datetime
 from typing import Generator, Dict, Optional
+import numpy as np
 from models import Transaction, TransactionStatus, PaymentMethod
 
 
@@ -15,16 +18,28 @@ class TransactionSimulator:
     MERCHANTS = ["Amazon", "Flipkart", "Swiggy", "Zomato", "Uber", "Ola", "BigBasket", "Myntra"]
     ERROR_CODES = ["E001_TIMEOUT", "E002_INSUFFICIENT_FUNDS", "E003_BANK_DECLINED", 
                    "E004_NETWORK_ERROR", "E005_FRAUD_SUSPECTED", "E006_LIMIT_EXCEEDED"]
+    PAYMENT_METHODS = list(PaymentMethod)
     
-    def __init__(self, base_failure_rate: float = 0.05):
+    def __init__(self, base_failure_rate: float = 0.05, seed: Optional[int] = None):
         """
         Initialize the simulator.
         
         Args:
             base_failure_rate: Base probability of transaction failure (0-1)
+            seed: Seed for this simulator's own RNG, for reproducible streams
         """
         self.base_failure_rate = base_failure_rate
         self.chaos_config: Dict[str, float] = {}  # bank_name -> failure_rate
+        self._rng = np.random.default_rng(seed)  # Vectorized draws for batches
+        self._scalar_rng = random.Random(seed)  # Per-call draws for single transactions
+        
+        # Effective failure rate per bank, aligned with BANKS
+        self._bank_index = {bank: i for i, bank in enumerate(self.BANKS)}
+        self._rates = np.full(len(self.BANKS), base_failure_rate)
+        
+        # Cheap unique IDs: random per-simulator prefix + monotonic counter
+        self._id_prefix = self._rng.bytes(4).hex()
+        self._id_counter = itertools.count()
         
     def inject_chaos(self, bank_name: str, failure_rate: float) -> None:
         """
@@ -35,6 +50,8 @@ class TransactionSimulator:
             failure_rate: Failure rate to apply (0-1)
         """
         self.chaos_config[bank_name] = min(max(failure_rate, 0), 1)
+        if bank_name in self._bank_index:
+            self._rates[self._bank_index[bank_name]] = self.chaos_config[bank_name]
         
     def remove_chaos(self, bank_name: Optional[str] = None) -> None:
         """
@@ -45,54 +62,47 @@ class TransactionSimulator:
         """
         if bank_name:
             self.chaos_config.pop(bank_name, None)
+            if bank_name in self._bank_index:
+                self._rates[self._bank_index[bank_name]] = self.base_failure_rate
         else:
             self.chaos_config.clear()
+            self._rates.fill(self.base_failure_rate)
             
     def get_chaos_status(self) -> Dict[str, float]:
         """Get current chaos configuration."""
         return self.chaos_config.copy()
     
-    def _get_failure_rate(self, bank_name: str) -> float:
-        """Get effective failure rate for a bank."""
-        return self.chaos_config.get(bank_name, self.base_failure_rate)
-    
-    def _generate_amount(self) -> float:
-        """Generate realistic transaction amount."""
-        # Mix of small and large transactions
-        if random.random() < 0.7:
-            # Small transactions (majority)
-            return round(random.uniform(50, 2000), 2)
-        else:
-            # Larger transactions
-            return round(random.uniform(2000, 50000), 2)
-    
-    def _generate_latency(self, is_failed: bool) -> int:
-        """Generate realistic latency in milliseconds."""
-        if is_failed:
-            # Failed transactions often have higher latency (timeouts)
-            return random.randint(500, 5000)
-        else:
-            # Successful transactions are usually faster
-            return random.randint(50, 500)
-    
     def generate_transaction(self) -> Transaction:
-        """Generate a single random transaction."""
-        bank_name = random.choice(self.BANKS)
-        failure_rate = self._get_failure_rate(bank_name)
+        """
+        Generate a single random transaction.
+        
+        Uses scalar draws: for one transaction, NumPy's per-call overhead
+        costs more than the vectorized calls in generate_batch save.
+        """
+        rng = self._scalar_rng
+        bank = rng.randrange(len(self.BANKS))
+        is_failed = rng.random() < self._rates[bank]
+        
+        # Mix of small (majority) and larger transactions
+        if rng.random() < 0.7:
+            amount = round(rng.uniform(50, 2000), 2)
+        else:
+            amount = round(rng.uniform(2000, 50000), 2)
         
-        is_failed = random.random() < failure_rate
-        status = TransactionStatus.FAILED if is_failed else TransactionStatus.SUCCESS
-        error_code = random.choice(self.ERROR_CODES) if is_failed else None
+        # Failed transactions often have higher latency (timeouts)
+        latency = rng.randint(500, 5000) if is_failed else rng.randint(50, 500)
         
-        return Transaction(
-            amount=self._generate_amount(),
+        return Transaction.model_construct(
+            id=f"{self._id_prefix}{next(self._id_counter):012x}",
+            amount=amount,
             currency="INR",
-            merchant_id=random.choice(self.MERCHANTS),
-            bank_name=bank_name,
-            payment_method=random.choice(list(PaymentMethod)),
-            status=status,
-            error_code=error_code,
-            latency_ms=self._generate_latency(is_failed)
+            merchant_id=rng.choice(self.MERCHANTS),
+            bank_name=self.BANKS[bank],
+            payment_method=rng.choice(self.PAYMENT_METHODS),
+            status=TransactionStatus.FAILED if is_failed else TransactionStatus.SUCCESS,
+            error_code=rng.choice(self.ERROR_CODES) if is_failed else None,
+            latency_ms=latency,
+            timestamp=datetime.now()
         )
     
     def stream_transactions(self, count: Optional[int] = None) -> Generator[Transaction, None, None]:
@@ -111,8 +121,62 @@ class TransactionSimulator:
             generated += 1
             
     def generate_batch(self, size: int = 10) -> list[Transaction]:
-        """Generate a batch of transactions."""
-        return [self.generate_transaction() for _ in range(size)]
+        """
+        Generate a batch of transactions.
+        
+        All randomness for the batch is drawn with vectorized NumPy calls
+        up front; only the final model construction is per transaction.
+        Values are valid by construction, so Pydantic validation is skipped.
+        Transactions in a batch share a single timestamp.
+        
+        Args:
+            size: Number of transactions to generate
+            
+        Returns:
+            List of Transaction objects
+        """
+        rng = self._rng
+        bank_idx = rng.integers(0, len(self.BANKS), size)
+        is_failed = rng.random(size) < self._rates[bank_idx]
+        
+        # Mix of small (majority) and larger transactions
+        amounts = np.round(np.where(
+            rng.random(size) < 0.7,
+            rng.uniform(50, 2000, size),
+            rng.uniform(2000, 50000, size)
+        ), 2)
+        
+        # Failed transactions often have higher latency (timeouts)
+        latencies = np.where(
+            is_failed,
+            rng.integers(500, 5001, size),
+            rng.integers(50, 501, size)
+        )
+        
+        merchant_idx = rng.integers(0, len(self.MERCHANTS), size)
+        method_idx = rng.integers(0, len(self.PAYMENT_METHODS), size)
+        error_idx = rng.integers(0, len(self.ERROR_CODES), size)
+        timestamp = datetime.now()
+        
+        return [
+            Transaction.model_construct(
+                id=f"{self._id_prefix}{next(self._id_counter):012x}",
+                amount=amount,
+                currency="INR",
+                merchant_id=self.MERCHANTS[m],
+                bank_name=self.BANKS[b],
+                payment_method=self.PAYMENT_METHODS[p],
+                status=TransactionStatus.FAILED if failed else TransactionStatus.SUCCESS,
+                error_code=self.ERROR_CODES[e] if failed else None,
+                latency_ms=latency,
+                timestamp=timestamp
+            )
+            for b, failed, amount, latency, m, p, e in zip(
+                bank_idx.tolist(), is_failed.tolist(), amounts.tolist(),
+                latencies.tolist(), merchant_idx.tolist(),
+                method_idx.tolist(), error_idx.tolist()
+            )
+        ]
 
 
 # Convenience function for quick testing
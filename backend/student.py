@@ -4,14 +4,16 @@ Implements incremental learning using River library.
 """
 
 from typing import Tuple, Dict, List, Optional
-from collections import deque
+from collections import OrderedDict
 import pickle
 import os
 
-from river import tree, preprocessing, compose
+import msgpack
+import numpy as np
+from river import tree, compose
 from river.base import Classifier
 
-from models import Transaction, Decision, ActionType, AgentSource
+from models import Transaction, Decision, ActionType, AgentSource, PaymentMethod
 
 
 class OnlineLearner:
@@ -31,14 +33,37 @@ class OnlineLearner:
     ERROR_MAP = {"E001_TIMEOUT": 0, "E002_INSUFFICIENT_FUNDS": 1, 
                  "E003_BANK_DECLINED": 2, "E004_NETWORK_ERROR": 3,
                  "E005_FRAUD_SUSPECTED": 4, "E006_LIMIT_EXCEEDED": 5}
-    ACTION_MAP = {
-        ActionType.SWITCH_GATEWAY: 0,
-        ActionType.INCREASE_RETRY: 1,
-        ActionType.BLOCK_MERCHANT: 2,
-        ActionType.REDUCE_LOAD: 3,
-        ActionType.NO_ACTION: 4
+    # Tree class labels are indices into ACTIONS
+    ACTIONS = (
+        ActionType.SWITCH_GATEWAY,
+        ActionType.INCREASE_RETRY,
+        ActionType.BLOCK_MERCHANT,
+        ActionType.REDUCE_LOAD,
+        ActionType.NO_ACTION
+    )
+    ACTION_MAP = {action: idx for idx, action in enumerate(ACTIONS)}
+    
+    # Precompiled lookups: one hash per categorical field.
+    # error_code -> (error, is_timeout, is_fraud_suspect)
+    ERROR_FEATURES = {
+        None: (-1, 0, 0),
+        "": (-1, 0, 0),
+        **{code: (idx, int(code == "E001_TIMEOUT"), int(code == "E005_FRAUD_SUSPECTED"))
+           for code, idx in ERROR_MAP.items()}
     }
-    REVERSE_ACTION_MAP = {v: k for k, v in ACTION_MAP.items()}
+    UNKNOWN_ERROR_FEATURES = (5, 0, 0)
+    METHOD_CODES = {PaymentMethod(name): code for name, code in METHOD_MAP.items()}
+    
+    MIN_TRAINING_SAMPLES = 20  # Samples before the Student may decide on its own
+    CONFIDENCE_WINDOW = 100  # Predictions averaged by get_average_confidence
+    FEATURE_CACHE_SIZE = 256  # Transactions whose extracted features are kept
+    RECENT_DECISIONS_SIZE = 50  # Learning records kept for analysis
+    MODEL_SNAPSHOT_INTERVAL = 500  # Samples between pickled model snapshots
+    STATE_FORMAT_VERSION = 1
+    
+    # Feature order, as produced by _compute_features
+    FEATURE_NAMES = ('amount', 'amount_log', 'bank', 'method', 'error',
+                     'latency', 'is_high_value', 'is_timeout', 'is_fraud_suspect')
     
     def __init__(self, confidence_threshold: float = 0.90):
         """
@@ -49,34 +74,65 @@ class OnlineLearner:
         """
         self.confidence_threshold = confidence_threshold
         
-        # Pipeline: preprocessing + classifier
-        self.model = compose.Pipeline(
-            preprocessing.StandardScaler(),
-            tree.HoeffdingTreeClassifier(
-                grace_period=50,
-                delta=0.01,  # Confidence threshold for splitting (formerly split_confidence)
-                leaf_prediction='mc'  # majority class
-            )
+        # Classifier; features are standardized inline before reaching it
+        self.model = tree.HoeffdingTreeClassifier(
+            grace_period=50,
+            delta=0.01,  # Confidence threshold for splitting (formerly split_confidence)
+            leaf_prediction='mc'  # majority class
         )
+        self._reset_scaler()
         
         # Track learning history
         self.samples_seen = 0
         self.correct_predictions = 0
-        self.confidence_history: deque = deque(maxlen=100)
-        self.recent_decisions: deque = deque(maxlen=50)
+        self._tree_samples = 0  # Samples the current tree was trained on
+        
+        # Last model snapshot written by this instance: (filepath, tree samples)
+        self._model_saved_to: Optional[str] = None
+        self._model_saved_at = 0
+        self._reset_confidence()
+        
+        # Ring of preallocated learning records, overwritten in place
+        self._rec_pool: List[Dict] = [
+            {'transaction_id': '', 'council_action': '', 'student_would_predict': '', 'confidence': 0.0}
+            for _ in range(self.RECENT_DECISIONS_SIZE)
+        ]
+        self._rec_head = 0
+        self._rec_filled = 0
+        
+        # Extracted features keyed by the (frozen, value-hashed) transaction;
+        # a transaction is typically predicted on arrival and learned from later
+        self._feature_cache: OrderedDict[Transaction, Dict[str, float]] = OrderedDict()
         
     def _extract_features(self, transaction: Transaction) -> Dict[str, float]:
-        """Extract numerical features from a transaction."""
+        """Extract numerical features from a transaction, once per transaction."""
+        features = self._feature_cache.get(transaction)
+        if features is not None:
+            self._feature_cache.move_to_end(transaction)
+            return features
+        
+        features = self._compute_features(transaction)
+        self._feature_cache[transaction] = features
+        if len(self._feature_cache) > self.FEATURE_CACHE_SIZE:
+            self._feature_cache.popitem(last=False)
+        return features
+    
+    def _compute_features(self, transaction: Transaction) -> Dict[str, float]:
+        """Compute numerical features for a transaction."""
+        amount = transaction.amount
+        error, is_timeout, is_fraud_suspect = self.ERROR_FEATURES.get(
+            transaction.error_code, self.UNKNOWN_ERROR_FEATURES
+        )
         return {
-            'amount': transaction.amount,
-            'amount_log': max(1, transaction.amount) ** 0.5,  # sqrt transform
+            'amount': amount,
+            'amount_log': max(1, amount) ** 0.5,  # sqrt transform
             'bank': self.BANK_MAP.get(transaction.bank_name, 7),
-            'method': self.METHOD_MAP.get(transaction.payment_method.value, 4),
-            'error': self.ERROR_MAP.get(transaction.error_code, 5) if transaction.error_code else -1,
+            'method': self.METHOD_CODES.get(transaction.payment_method, 4),
+            'error': error,
             'latency': transaction.latency_ms,
-            'is_high_value': 1 if transaction.amount > 10000 else 0,
-            'is_timeout': 1 if transaction.error_code == "E001_TIMEOUT" else 0,
-            'is_fraud_suspect': 1 if transaction.error_code == "E005_FRAUD_SUSPECTED" else 0,
+            'is_high_value': 1 if amount > 10000 else 0,
+            'is_timeout': is_timeout,
+            'is_fraud_suspect': is_fraud_suspect,
         }
     
     def predict(self, transaction: Transaction) -> Tuple[ActionType, float]:
@@ -89,30 +145,27 @@ class OnlineLearner:
         Returns:
             Tuple of (predicted ActionType, confidence score)
         """
-        features = self._extract_features(transaction)
+        return self._predict_from_features(self._extract_features(transaction))
+    
+    def _predict_from_features(self, features: Dict[str, float]) -> Tuple[ActionType, float]:
+        """Predict the action for already-extracted features."""
+        if self._tree_samples == 0:
+            # Untrained tree has no class probabilities yet
+            return ActionType.NO_ACTION, 0.0
         
         # Get prediction probabilities
-        try:
-            probas = self.model.predict_proba_one(features)
-            
-            if not probas:
-                # Model hasn't learned enough yet
-                return ActionType.NO_ACTION, 0.0
-            
-            # Get the class with highest probability
-            best_class = max(probas, key=probas.get)
-            confidence = probas[best_class]
-            
-            action = self.REVERSE_ACTION_MAP.get(best_class, ActionType.NO_ACTION)
-            
-            # Track confidence
-            self.confidence_history.append(confidence)
-            
-            return action, confidence
-            
-        except Exception as e:
-            print(f"Prediction error: {e}")
-            return ActionType.NO_ACTION, 0.0
+        probas = self.model.predict_proba_one(self._standardize(features))
+        
+        # Get the class with highest probability
+        best_class = max(probas, key=probas.get)
+        confidence = probas[best_class]
+        
+        action = self.ACTIONS[best_class]
+        
+        # Track confidence
+        self._record_confidence(confidence)
+        
+        return action, confidence
     
     def learn(self, transaction: Transaction, council_decision: Decision) -> None:
         """
@@ -122,31 +175,105 @@ class OnlineLearner:
             transaction: The transaction that was analyzed
             council_decision: The decision made by the Council
         """
-        features = self._extract_features(transaction)
-        label = self.ACTION_MAP.get(council_decision.action, 4)
+        self._learn_from_features(transaction, self._extract_features(transaction), council_decision)
+    
+    def learn_batch(self, transactions: List[Transaction], council_decision: Decision) -> None:
+        """
+        Learn from one Council decision applied to a batch of transactions.
+        
+        Args:
+            transactions: The transactions the decision covers
+            council_decision: The decision made by the Council
+        """
+        for transaction in transactions:
+            self._learn_from_features(transaction, self._extract_features(transaction), council_decision)
+    
+    def _learn_from_features(self, transaction: Transaction, features: Dict[str, float],
+                             council_decision: Decision) -> None:
+        """Learn from a Council decision given already-extracted features."""
+        label = self.ACTION_MAP[council_decision.action]
         
         # Check if our prediction would have been correct
-        predicted_action, confidence = self.predict(transaction)
+        predicted_action, confidence = self._predict_from_features(features)
         if predicted_action == council_decision.action:
             self.correct_predictions += 1
         
-        # Update the model
-        self.model.learn_one(features, label)
+        # Update the scaler, then the tree on the rescaled features
+        self._update_scaler(features)
+        self.model.learn_one(self._standardize(features), label)
         self.samples_seen += 1
+        self._tree_samples += 1
         
         # Track for analysis
-        self.recent_decisions.append({
-            'transaction_id': transaction.id,
-            'council_action': council_decision.action.value,
-            'student_would_predict': predicted_action.value,
-            'confidence': confidence
-        })
+        slot = self._rec_pool[self._rec_head]
+        slot['transaction_id'] = transaction.id
+        slot['council_action'] = council_decision.action.value
+        slot['student_would_predict'] = predicted_action.value
+        slot['confidence'] = confidence
+        self._rec_head = (self._rec_head + 1) % self.RECENT_DECISIONS_SIZE
+        self._rec_filled = min(self._rec_filled + 1, self.RECENT_DECISIONS_SIZE)
+    
+    def _reset_scaler(self) -> None:
+        """Forget the running per-feature mean and variance."""
+        self._scale_n = 0
+        self._mean = np.zeros(len(self.FEATURE_NAMES), dtype=np.float64)
+        self._M2 = np.zeros(len(self.FEATURE_NAMES), dtype=np.float64)
+        self._inv_std = np.zeros(len(self.FEATURE_NAMES), dtype=np.float64)
+        # Standardized features handed to the tree, refilled in place per call;
+        # River reads the values but keeps no reference to the dict
+        self._scaled = dict.fromkeys(self.FEATURE_NAMES, 0.0)
+    
+    def _update_scaler(self, features: Dict[str, float]) -> None:
+        """Welford update of the running mean and squared deviations."""
+        x = np.array(list(features.values()))
+        self._scale_n += 1
+        delta = x - self._mean
+        self._mean += delta / self._scale_n
+        self._M2 += delta * (x - self._mean)
+        self._refresh_inv_std()
+    
+    def _refresh_inv_std(self) -> None:
+        """Recompute 1/std once per update so standardizing is one multiply."""
+        std = np.sqrt(self._M2 / max(self._scale_n, 1))
+        self._inv_std = np.divide(1.0, std, out=np.zeros_like(std), where=std > 0)
+    
+    def _standardize(self, features: Dict[str, float]) -> Dict[str, float]:
+        """Z-score features with the running stats; zero-variance features map to 0."""
+        z = (np.array(list(features.values())) - self._mean) * self._inv_std
+        self._scaled.update(zip(self.FEATURE_NAMES, z.tolist()))
+        return self._scaled
+    
+    def get_recent_decisions(self, n: int = RECENT_DECISIONS_SIZE) -> List[Dict]:
+        """Get copies of the last n learning records, oldest first."""
+        n = min(n, self._rec_filled)
+        size = self.RECENT_DECISIONS_SIZE
+        return [dict(self._rec_pool[(self._rec_head - n + i) % size]) for i in range(n)]
+    
+    def _reset_confidence(self) -> None:
+        """Empty the confidence ring buffer."""
+        self._conf_buf: List[float] = [0.0] * self.CONFIDENCE_WINDOW
+        self._conf_head = 0
+        self._conf_count = 0
+        self._conf_sum = 0.0
+    
+    def _record_confidence(self, confidence: float) -> None:
+        """Add a confidence to the ring buffer, keeping the running sum in step."""
+        self._conf_sum += confidence - self._conf_buf[self._conf_head]
+        self._conf_buf[self._conf_head] = confidence
+        self._conf_head = (self._conf_head + 1) % self.CONFIDENCE_WINDOW
+        self._conf_count = min(self._conf_count + 1, self.CONFIDENCE_WINDOW)
+    
+    def _confidence_values(self) -> List[float]:
+        """Get buffered confidences, oldest first."""
+        if self._conf_count < self.CONFIDENCE_WINDOW:
+            return self._conf_buf[:self._conf_count]
+        return self._conf_buf[self._conf_head:] + self._conf_buf[:self._conf_head]
     
     def get_average_confidence(self) -> float:
         """Get rolling average confidence score."""
-        if not self.confidence_history:
+        if not self._conf_count:
             return 0.0
-        return sum(self.confidence_history) / len(self.confidence_history)
+        return self._conf_sum / self._conf_count
     
     def get_accuracy(self) -> float:
         """Get prediction accuracy vs Council decisions."""
@@ -164,12 +291,12 @@ class OnlineLearner:
         Returns:
             Tuple of (is_confident, predicted_action, confidence)
         """
+        if self._tree_samples < self.MIN_TRAINING_SAMPLES:
+            # Still warming up: can't be confident, so skip the prediction
+            return False, ActionType.NO_ACTION, 0.0
+        
         action, confidence = self.predict(transaction)
-        is_confident = (
-            confidence >= self.confidence_threshold and 
-            self.samples_seen >= 20  # Minimum training samples
-        )
-        return is_confident, action, confidence
+        return confidence >= self.confidence_threshold, action, confidence
     
     def get_stats(self) -> Dict:
         """Get model statistics."""
@@ -178,31 +305,112 @@ class OnlineLearner:
             'accuracy': self.get_accuracy(),
             'average_confidence': self.get_average_confidence(),
             'confidence_threshold': self.confidence_threshold,
-            'is_ready': self.samples_seen >= 20,
-            'recent_decisions': list(self.recent_decisions)[-5:]
+            'is_ready': self._tree_samples >= self.MIN_TRAINING_SAMPLES,
+            'recent_decisions': self.get_recent_decisions(5)
         }
     
-    def save(self, filepath: str) -> None:
-        """Save model to disk."""
-        with open(filepath, 'wb') as f:
-            pickle.dump({
-                'model': self.model,
-                'samples_seen': self.samples_seen,
-                'correct_predictions': self.correct_predictions,
-                'confidence_history': list(self.confidence_history)
-            }, f)
+    def save(self, filepath: str, include_model: Optional[bool] = None) -> None:
+        """
+        Save learner state to disk.
+        
+        Counters and the confidence buffer are written to a small msgpack
+        file (``filepath + '.state'``) on every call. The River model is
+        pickled to ``filepath`` only every MODEL_SNAPSHOT_INTERVAL samples,
+        or when this learner has not written or loaded ``filepath`` yet. The
+        pickle records how many samples its tree was trained on, so a reload
+        gates on the tree rather than on the newer counters. Both writes are
+        atomic.
+        
+        Args:
+            filepath: Path of the model snapshot
+            include_model: Force (True) or skip (False) the model snapshot
+        """
+        if include_model is None:
+            include_model = (
+                self._model_saved_to != filepath or
+                self._tree_samples - self._model_saved_at >= self.MODEL_SNAPSHOT_INTERVAL
+            )
+        
+        if include_model:
+            self._atomic_write(filepath, pickle.dumps(
+                {'model': self.model, 'scaler': self._scaler_state(),
+                 'tree_samples': self._tree_samples},
+                protocol=pickle.HIGHEST_PROTOCOL
+            ))
+            self._model_saved_to = filepath
+            self._model_saved_at = self._tree_samples
+        
+        self._atomic_write(filepath + '.state', msgpack.packb({
+            'version': self.STATE_FORMAT_VERSION,
+            'samples_seen': self.samples_seen,
+            'correct_predictions': self.correct_predictions,
+            'confidence_history': self._confidence_values()
+        }))
+    
+    def _scaler_state(self) -> Dict:
+        """Running scaler stats, saved with the tree they were used to train."""
+        return {'n': self._scale_n, 'mean': self._mean.tolist(), 'M2': self._M2.tolist()}
+    
+    def _load_scaler_state(self, scaler: Dict) -> None:
+        """Restore running scaler stats written by _scaler_state."""
+        self._scale_n = scaler['n']
+        self._mean = np.array(scaler['mean'], dtype=np.float64)
+        self._M2 = np.array(scaler['M2'], dtype=np.float64)
+        self._refresh_inv_std()
+    
+    @staticmethod
+    def _atomic_write(filepath: str, data: bytes) -> None:
+        """Write bytes to a temp file and move it into place."""
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
     
     def load(self, filepath: str) -> bool:
-        """Load model from disk."""
+        """Load learner state from disk (see save for the file layout)."""
         if not os.path.exists(filepath):
             return False
         try:
+            state_path = filepath + '.state'
+            state = None
+            if os.path.exists(state_path):
+                with open(state_path, 'rb') as f:
+                    state = msgpack.unpackb(f.read())
+                if state.get('version') != self.STATE_FORMAT_VERSION:
+                    raise ValueError(
+                        f"unsupported state format {state.get('version')!r} in {state_path}, "
+                        f"expected {self.STATE_FORMAT_VERSION}"
+                    )
+            
             with open(filepath, 'rb') as f:
                 data = pickle.load(f)
-                self.model = data['model']
-                self.samples_seen = data['samples_seen']
-                self.correct_predictions = data['correct_predictions']
-                self.confidence_history = deque(data['confidence_history'], maxlen=100)
+            
+            # Snapshots from before the split keep all state in the pickle
+            if state is None:
+                state = data
+            
+            model = data['model']
+            if isinstance(model, compose.Pipeline):
+                # Older snapshots wrap the tree in a StandardScaler pipeline
+                scaler, model = model.steps.values()
+                n = max(scaler.counts.values(), default=0)
+                self._load_scaler_state({
+                    'n': n,
+                    'mean': [scaler.means[name] for name in self.FEATURE_NAMES],
+                    'M2': [scaler.vars[name] * n for name in self.FEATURE_NAMES]
+                })
+            else:
+                self._load_scaler_state(data['scaler'])
+            self.model = model
+            # Older snapshots wrote the counters with the tree, so they agree
+            self._tree_samples = data.get('tree_samples', data.get('samples_seen', 0))
+            self._model_saved_to = filepath
+            self._model_saved_at = self._tree_samples
+            self.samples_seen = state['samples_seen']
+            self.correct_predictions = state['correct_predictions']
+            self._reset_confidence()
+            for confidence in state['confidence_history'][-self.CONFIDENCE_WINDOW:]:
+                self._record_confidence(confidence)
             return True
         except Exception as e:
             print(f"Failed to load model: {e}")
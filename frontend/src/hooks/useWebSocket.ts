@@ -7,6 +7,7 @@ const WS_URL = IS_LOCAL
     ? 'ws://localhost:8000/ws'
     : 'wss://hackathon-3zry.onrender.com/ws';
 const RECONNECT_DELAY = 3000;
+const textDecoder = new TextDecoder();
 
 export interface UseWebSocketReturn {
     isConnected: boolean;
@@ -53,7 +54,9 @@ export function useWebSocket(): UseWebSocketReturn {
 
     const handleMessage = useCallback((event: MessageEvent) => {
         try {
-            const message: WebSocketMessage = JSON.parse(event.data);
+            // Backend sends UTF-8 JSON as binary frames
+            const raw = typeof event.data === 'string' ? event.data : textDecoder.decode(event.data);
+            const message: WebSocketMessage = JSON.parse(raw);
 
             switch (message.type) {
                 case 'transaction': {
@@ -117,6 +120,7 @@ export function useWebSocket(): UseWebSocketReturn {
 
         try {
             wsRef.current = new WebSocket(WS_URL);
+            wsRef.current.binaryType = 'arraybuffer';
 
             wsRef.current.onopen = () => {
                 setIsConnected(true);